@@ -1,90 +1,211 @@
-from typing import List, Dict
-from llama_index.core import VectorStoreIndex, QueryBundle
-from llama_index.core.postprocessor import SimilarityPostprocessor
+import asyncio
+import math
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import combinations
+from typing import List, Dict, Optional, Tuple, Union
+import numpy as np
+from llama_index.core import VectorStoreIndex, Settings
 from llama_index.graph_stores.neo4j import Neo4jGraphStore
 
+# Cypher condition for each supported graph criterion
+GRAPH_FILTERS = {
+    "company": "c.name CONTAINS $company",
+    "connected_after": "p.connected_on >= $connected_after",
+    "connected_before": "p.connected_on <= $connected_before",
+}
+
+# Minimum cosine similarity for a vector match; equivalent to the 0.7 cutoff
+# on the exp(-distance) scores LlamaIndex reports for Chroma
+SIMILARITY_CUTOFF = 1 + math.log(0.7)
+
 class LinkedInAnalyzer:
     def __init__(self, vector_index: VectorStoreIndex, graph_store: Neo4jGraphStore):
         self.vector_index = vector_index
         self.graph_store = graph_store
         
-        # Initialize query engines
-        self.vector_query_engine = vector_index.as_query_engine(
-            similarity_top_k=50,
-            node_postprocessors=[
-                SimilarityPostprocessor(similarity_cutoff=0.7)
-            ]
-        )
+        # Worker for graph queries that overlap with query embedding
+        self._executor = ThreadPoolExecutor(max_workers=4)
+        
+        # Prebuild one parameterized Cypher query per combination of criteria
+        self._query_variants = {
+            frozenset(keys): self._compose_graph_query(keys)
+            for size in range(len(GRAPH_FILTERS) + 1)
+            for keys in combinations(GRAPH_FILTERS, size)
+        }
+        
+        # Load every profile vector once; all vector search is an exact
+        # inner-product scan over this matrix (ChromaVectorStore.client is the
+        # underlying Chroma collection, and vectors were L2-normalized at insert)
+        data = vector_index.vector_store.client.get(include=["embeddings", "metadatas"])
+        if len(data["ids"]):
+            self._emb = np.asarray(data["embeddings"], dtype=np.float32)
+        else:
+            self._emb = np.empty((0, 0), dtype=np.float32)
+        self._names = [metadata["name"] for metadata in data["metadatas"]]
+        self._companies = [metadata.get("company", "") for metadata in data["metadatas"]]
+        self._name_to_row = {}
+        company_rows = defaultdict(list)
+        for row, (name, company) in enumerate(zip(self._names, self._companies)):
+            self._name_to_row.setdefault(name, row)
+            company_rows[company].append(row)
+        self._name_counts = Counter(self._names)
+        self._company_rows = {
+            company: np.asarray(rows, dtype=np.intp)
+            for company, rows in company_rows.items()
+        }
+
+    def _retrieve(self, query_emb: Union[List[float], np.ndarray], top_k: int,
+                  rows: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Return (row, similarity) for the top_k profiles above the similarity cutoff"""
+        # Copy, since the query may be a row of self._emb
+        query_emb = np.array(query_emb, dtype=np.float32)
+        query_emb /= np.linalg.norm(query_emb) + 1e-12
+        top, similarities = self._similar(query_emb, top_k, rows)
+        return [
+            (row, similarity)
+            for row, similarity in zip(top.tolist(), similarities.tolist())
+            if similarity >= SIMILARITY_CUTOFF
+        ]
 
-    def find_interesting_connections(self, criteria: Dict[str, str]) -> List[Dict]:
+    def find_interesting_connections(self, criteria: Dict[str, str], top_k: int = 10) -> List[Dict]:
         """Find interesting connections based on given criteria"""
-        # First use graph query to filter initial set
-        graph_query = self._build_graph_query(criteria)
-        initial_candidates = self.graph_store.query(graph_query)
+        graph_query, graph_params = self._build_graph_query(criteria)
+        vector_query = self._build_vector_query(criteria)
+        
+        # Run the graph query to filter the initial set in a worker thread
+        # while the search query is embedded; the two are independent
+        graph_future = self._executor.submit(
+            self.graph_store.query, graph_query, param_map=graph_params
+        )
+        query_embedding = Settings.embed_model.get_query_embedding(vector_query)
+        initial_candidates = graph_future.result()
         
-        # Use vector search for semantic matching
+        return self._search_and_rank(criteria, top_k, initial_candidates, query_embedding)
+
+    async def afind_interesting_connections(self, criteria: Dict[str, str], top_k: int = 10) -> List[Dict]:
+        """Async variant of find_interesting_connections for callers with an event loop"""
+        graph_query, graph_params = self._build_graph_query(criteria)
         vector_query = self._build_vector_query(criteria)
-        vector_results = self.vector_query_engine.query(vector_query)
+        
+        initial_candidates, query_embedding = await asyncio.gather(
+            asyncio.to_thread(self.graph_store.query, graph_query, param_map=graph_params),
+            Settings.embed_model.aget_query_embedding(vector_query)
+        )
+        
+        return self._search_and_rank(criteria, top_k, initial_candidates, query_embedding)
+
+    def _search_and_rank(self, criteria: Dict[str, str], top_k: int,
+                         initial_candidates: List[Dict], query_embedding: List[float]) -> List[Dict]:
+        """Run the vector search for an embedded query and rank it with the graph results"""
+        # Use vector search for semantic matching, restricted to profiles at
+        # the companies the graph query matched
+        vector_matches = []
+        if "company" not in criteria:
+            vector_matches = self._retrieve(query_embedding, top_k)
+        else:
+            companies = {result["c.name"] for result in initial_candidates}
+            rows = [self._company_rows[c] for c in companies if c in self._company_rows]
+            if rows:
+                vector_matches = self._retrieve(query_embedding, top_k, np.concatenate(rows))
         
         # Combine results with scoring
         combined_results = self._combine_and_rank_results(
             initial_candidates, 
-            vector_results, 
+            vector_matches, 
             criteria
         )
         
         return combined_results
 
-    def _combine_and_rank_results(self, graph_results, vector_results, criteria):
+    def _combine_and_rank_results(self, graph_results, vector_matches, criteria):
         """Combine and rank results based on multiple factors"""
-        scores = {}
+        # Give every person an integer id in order of first appearance
+        name_to_id = {}
+        graph_ids = np.fromiter(
+            (name_to_id.setdefault(result['p.name'], len(name_to_id)) for result in graph_results),
+            dtype=np.intp,
+            count=len(graph_results)
+        )
+        vector_ids = np.fromiter(
+            (name_to_id.setdefault(self._names[row], len(name_to_id)) for row, _ in vector_matches),
+            dtype=np.intp,
+            count=len(vector_matches)
+        )
         
-        # Score based on graph results (exact matches)
-        for result in graph_results:
-            person_name = result['p.name']
-            scores[person_name] = scores.get(person_name, 0) + 1.0
-            
-            # Bonus for matching industry
-            if criteria.get('industry') and result.get('i.name') == criteria['industry']:
-                scores[person_name] += 0.5
-            
-            # Bonus for senior roles
-            if criteria.get('role_level') and 'senior' in result.get('p.title', '').lower():
-                scores[person_name] += 0.3
+        # Score based on graph results (exact matches), one point per match
+        graph_weights = np.ones(len(graph_ids))
+        
+        # Bonus for matching industry
+        industry = criteria.get('industry')
+        if industry:
+            graph_weights += 0.5 * np.fromiter(
+                (result.get('i.name') == industry for result in graph_results),
+                dtype=bool,
+                count=len(graph_results)
+            )
+        
+        # Bonus for senior roles
+        if criteria.get('role_level'):
+            graph_weights += 0.3 * np.fromiter(
+                ('senior' in (result.get('p.title') or '').lower() for result in graph_results),
+                dtype=bool,
+                count=len(graph_results)
+            )
         
         # Score based on vector similarity
-        for node in vector_results.source_nodes:
-            person_name = node.metadata['name']
-            similarity_score = node.score if hasattr(node, 'score') else 0.5
-            scores[person_name] = scores.get(person_name, 0) + similarity_score
-        
-        # Sort by final score
-        ranked_results = sorted(
-            scores.items(), 
-            key=lambda x: x[1], 
-            reverse=True
+        vector_weights = np.fromiter(
+            (similarity for _, similarity in vector_matches),
+            dtype=np.float64,
+            count=len(vector_matches)
         )
         
+        # Sum the weights per person in one pass
+        scores = np.bincount(
+            np.concatenate([graph_ids, vector_ids]),
+            weights=np.concatenate([graph_weights, vector_weights]),
+            minlength=len(name_to_id)
+        )
+        
+        # Sort by final score, keeping first-appearance order for ties
+        names = list(name_to_id)
+        order = np.argsort(-scores, kind="stable")
+        ranked_results = [(names[i], float(scores[i])) for i in order.tolist()]
+        
         return ranked_results
 
-    def _build_graph_query(self, criteria: Dict[str, str]) -> str:
-        """Build Cypher query based on criteria"""
-        query = """
-        MATCH (p:Person)-[:WORKS_AT]->(c:Company)
-        WHERE 1=1
-        """
+    def _similar(self, query_emb: np.ndarray, k: int,
+                 rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the k rows (of all, or of rows) most similar to query_emb, best first, with their similarities"""
+        emb = self._emb if rows is None else self._emb[rows]
+        k = min(k, len(emb))
+        if k == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
         
-        if "company" in criteria:
-            query += f"\nAND c.name CONTAINS '{criteria['company']}'"
-        if "connected_after" in criteria:
-            query += f"\nAND p.connected_on >= '{criteria['connected_after']}'"
-        if "connected_before" in criteria:
-            query += f"\nAND p.connected_on <= '{criteria['connected_before']}'"
-            
-        query += "\nRETURN p, c"
+        # Exact search: one matrix-vector product over the candidate rows
+        similarities = emb @ query_emb
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top])]
+        return (top if rows is None else rows[top]), similarities[top]
+
+    @staticmethod
+    def _compose_graph_query(keys: Tuple[str, ...]) -> str:
+        """Compose the Cypher query filtering on the given criteria"""
+        query = "MATCH (p:Person)-[:WORKS_AT]->(c:Company)"
+        if keys:
+            query += "\nWHERE " + "\nAND ".join(GRAPH_FILTERS[key] for key in keys)
+        query += "\nRETURN p.name, c.name"
         
         return query
 
+    def _build_graph_query(self, criteria: Dict[str, str]) -> Tuple[str, Dict]:
+        """Look up the parameterized Cypher query for the given criteria"""
+        # Each set of criteria always maps to the same query text, so Neo4j
+        # reuses its cached plan, and unset criteria add no predicates
+        params = {key: criteria[key] for key in GRAPH_FILTERS if key in criteria}
+        
+        return self._query_variants[frozenset(params)], params
+
     def _build_vector_query(self, criteria: Dict[str, str]) -> str:
         """Build semantic search query based on criteria"""
         query = f"""
@@ -98,28 +219,55 @@ class LinkedInAnalyzer:
 
     def get_connection_details(self, name: str) -> Dict:
         """Get detailed information about a specific connection"""
-        # Get graph relationships
-        graph_info = self.graph_store.query(f"""
-            MATCH (p:Person {{name: '{name}'}})-[r]->(c:Company)
-            RETURN {{
-                person: p,
-                company: c
-            }} as result
-        """)
-        
-        # Get similar profiles using vector search
-        similar_profiles = self.vector_query_engine.query(
-            f"Find professionals similar to {name}"
-        ).source_nodes
+        # Get the person, their company and all outgoing relationships at once
+        graph_info = self.graph_store.query("""
+            MATCH (p:Person {name: $name})
+            RETURN p AS person,
+                head([(p)-[:WORKS_AT]->(c:Company) | c]) AS company,
+                [(p)-[r]->(n) | {rel: type(r), node: n}] AS related
+        """, param_map={"name": name})
         
-        return {
-            "graph_info": graph_info,
-            "similar_profiles": [
+        row = self._name_to_row.get(name)
+        if row is not None:
+            # Rank against the stored vectors directly; skip every profile
+            # sharing the name, so fetch enough extra matches to cover them
+            matches = self._retrieve(self._emb[row], 5 + self._name_counts[name])
+            similar_profiles = [
                 {
-                    "name": node.metadata["name"],
-                    "company": node.metadata.get("company", ""),
-                    "similarity": node.score if hasattr(node, "score") else None
+                    "name": self._names[i],
+                    "company": self._companies[i],
+                    "similarity": similarity
                 }
-                for node in similar_profiles[:5]
+                for i, similarity in matches if self._names[i] != name
+            ][:5]
+        else:
+            # Unknown name, fall back to a semantic vector search
+            query_embedding = Settings.embed_model.get_query_embedding(
+                f"Find professionals similar to {name}"
+            )
+            similar_profiles = [
+                {
+                    "name": self._names[i],
+                    "company": self._companies[i],
+                    "similarity": similarity
+                }
+                for i, similarity in self._retrieve(query_embedding, 5)
             ]
-        } 
\ No newline at end of file
+        
+        return {
+            "graph_info": graph_info,
+            "similar_profiles": similar_profiles
+        }
+
+    def get_connection_details_batch(self, names: List[str]) -> Dict[str, Dict]:
+        """Get graph information for several connections in one query"""
+        rows = self.graph_store.query("""
+            UNWIND $names AS name
+            MATCH (p:Person {name: name})
+            RETURN name,
+                p AS person,
+                head([(p)-[:WORKS_AT]->(c:Company) | c]) AS company,
+                [(p)-[r]->(n) | {rel: type(r), node: n}] AS related
+        """, param_map={"names": names})
+        
+        return {row.pop("name"): row for row in rows}
@@ -1,19 +1,49 @@
-from typing import List, Dict
-from llama_index.core import Document, VectorStoreIndex, StorageContext
-from llama_index.core.node_parser import SentenceSplitter
+from dataclasses import dataclass
+from typing import IO, List, Dict, Optional, Union
+from llama_index.core import VectorStoreIndex, StorageContext
 from llama_index.vector_stores.chroma import ChromaVectorStore
 from llama_index.graph_stores.neo4j import Neo4jGraphStore
 from llama_index.core import Settings
+from chromadb.errors import ChromaError
+from neo4j import GraphDatabase
 import chromadb
+import hashlib
+import io
+import json
+import os
+import uuid
+import numpy as np
 import pandas as pd
 
+CHROMA_PATH = "./data/chroma"
+MANIFEST_PATH = os.path.join(CHROMA_PATH, "_manifest.json")
+
+# Number of per-CSV collections kept before the least recently used is dropped
+MAX_STORED_COLLECTIONS = 8
+
+COLLECTION_METADATA = {
+    "hnsw:space": "ip",
+}
+
+def csv_digest(csv_bytes: bytes) -> str:
+    """Content hash identifying a connections CSV"""
+    return hashlib.blake2b(csv_bytes, digest_size=16).hexdigest()
+
+@dataclass
+class IngestBatch:
+    """LinkedIn connections stored column-wise, one array entry per row"""
+    texts: List[str]
+    names: np.ndarray
+    companies: np.ndarray
+    urls: np.ndarray
+    emails: np.ndarray
+    dates: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
 class LinkedInDataIngester:
     def __init__(self, neo4j_url: str, neo4j_username: str, neo4j_password: str):
-        # Initialize vector store
-        self.chroma_client = chromadb.PersistentClient(path="./data/chroma")
-        self.chroma_collection = self.chroma_client.create_collection("linkedin_connections")
-        self.vector_store = ChromaVectorStore(chroma_collection=self.chroma_collection)
-        
         # Initialize graph store
         self.graph_store = Neo4jGraphStore(
             username=neo4j_username,
@@ -22,77 +52,232 @@ class LinkedInDataIngester:
             database="linkedin"
         )
         
-        # Initialize storage context
+        # Neo4jGraphStore doesn't forward driver options, so swap in a driver
+        # with an explicitly sized, kept-alive connection pool
+        self.graph_store._driver.close()
+        self.graph_store._driver = GraphDatabase.driver(
+            neo4j_url,
+            auth=(neo4j_username, neo4j_password),
+            max_connection_pool_size=50,
+            connection_acquisition_timeout=30,
+            keep_alive=True
+        )
+        
+        # Warm Neo4j's page cache with the Person/Company graph before the
+        # first user query
+        self.graph_store.query(
+            "MATCH (p:Person)-[:WORKS_AT]->(c:Company) RETURN count(p)"
+        )
+        
+        # Initialize vector store client; the collection, vector store and
+        # storage context are set per CSV by ingest() / build_indexes()
+        self.chroma_client = chromadb.PersistentClient(path=CHROMA_PATH)
+        self.chroma_collection = None
+        self.vector_store = None
+        self.storage_context = None
+
+    def _use_collection(self, collection):
+        """Point the vector store and storage context at a Chroma collection"""
+        self.chroma_collection = collection
+        self.vector_store = ChromaVectorStore(chroma_collection=self.chroma_collection)
         self.storage_context = StorageContext.from_defaults(
             vector_store=self.vector_store,
             graph_store=self.graph_store
         )
+
+    def ingest(self, csv_file: Union[str, bytes], csv_hash: Optional[str] = None) -> VectorStoreIndex:
+        """Load, graph and index a CSV, reusing earlier results if it is unchanged"""
+        if isinstance(csv_file, str):
+            with open(csv_file, "rb") as f:
+                csv_file = f.read()
+        
+        # Callers that already hashed the file pass csv_digest(csv_file) in
+        if csv_hash is None:
+            csv_hash = csv_digest(csv_file)
+        collection_name = f"linkedin_connections_{csv_hash}"
+        batch = None
+        
+        # Graph: skip if this CSV has already been merged into Neo4j
+        marker = self.graph_store.query(
+            "MATCH (m:IngestMarker {hash: $hash}) RETURN m",
+            param_map={"hash": csv_hash}
+        )
+        if not marker:
+            batch = self.load_linkedin_data(io.BytesIO(csv_file))
+            self.create_knowledge_graph(batch)
+            self.graph_store.query(
+                "MERGE (m:IngestMarker {hash: $hash})",
+                param_map={"hash": csv_hash}
+            )
         
-        # Initialize node parser
-        self.node_parser = SentenceSplitter(chunk_size=512, chunk_overlap=20)
+        # Vectors: reuse the collection recorded for this CSV if it still exists
+        collections = self._read_manifest().get("collections", {})
+        if collections.get(csv_hash) == collection_name:
+            try:
+                self._use_collection(self.chroma_client.get_collection(collection_name))
+                vector_index = VectorStoreIndex.from_vector_store(self.vector_store)
+            except (ValueError, ChromaError):
+                vector_index = None
+            if vector_index is not None:
+                self._record_collection(csv_hash, collection_name)
+                return vector_index
+        
+        if batch is None:
+            batch = self.load_linkedin_data(io.BytesIO(csv_file))
+        vector_index = self.build_indexes(batch, collection_name)
+        self._record_collection(csv_hash, collection_name)
+        
+        return vector_index
+
+    def _record_collection(self, csv_hash: str, collection_name: str):
+        """Mark a CSV's collection as most recently used, dropping the oldest ones"""
+        collections = self._read_manifest().get("collections", {})
+        collections.pop(csv_hash, None)
+        collections[csv_hash] = collection_name
+        
+        # Collections of other CSVs may still back live analyzers, so only
+        # the least recently used beyond MAX_STORED_COLLECTIONS are deleted
+        while len(collections) > MAX_STORED_COLLECTIONS:
+            stale = collections.pop(next(iter(collections)))
+            try:
+                self.chroma_client.delete_collection(stale)
+            except (ValueError, ChromaError):
+                pass
+        
+        with open(MANIFEST_PATH, "w") as f:
+            json.dump({"collections": collections}, f)
 
-    def load_linkedin_data(self, csv_path: str) -> List[Document]:
-        """Load LinkedIn data from CSV and convert to Documents"""
-        df = pd.read_csv(csv_path)
-        documents = []
-        
-        for _, row in df.iterrows():
-            # Create full name from first and last name
-            full_name = f"{row['First Name']} {row['Last Name']}"
-            
-            # Create document text from profile data
-            text = f"""
-            Name: {full_name}
-            Company: {row['Company']}
-            URL: {row['URL']}
-            Email: {row.get('Email Address', '')}
-            Connected On: {row['Connected On']}
+    def _read_manifest(self) -> Dict:
+        """Read the record of indexed CSVs, oldest first, if any"""
+        try:
+            with open(MANIFEST_PATH) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def load_linkedin_data(self, csv_file: Union[str, IO[bytes]]) -> IngestBatch:
+        """Load LinkedIn data from a CSV path or binary file into column arrays"""
+        # The pyarrow engine parses the CSV in multithreaded C++ rather than
+        # pandas' own parser
+        df = pd.read_csv(csv_file, dtype=str, keep_default_na=False, engine="pyarrow")
+        
+        # Pull columns out once instead of building a Series per row
+        names = (df["First Name"] + " " + df["Last Name"]).to_numpy()
+        companies = df["Company"].to_numpy()
+        urls = df["URL"].to_numpy()
+        if "Email Address" in df.columns:
+            emails = df["Email Address"].to_numpy()
+        else:
+            emails = np.full(len(df), "", dtype=object)
+        dates = df["Connected On"].to_numpy()
+        
+        # Create document text from profile data
+        texts = [
+            f"""
+            Name: {name}
+            Company: {company}
+            URL: {url}
+            Email: {email}
+            Connected On: {date}
             """
-            
-            # Create metadata
-            metadata = {
-                "name": full_name,
-                "company": row["Company"],
-                "linkedin_url": row["URL"],
-                "email": row.get("Email Address", ""),
-                "connected_on": row["Connected On"],
-            }
-            
-            doc = Document(text=text, metadata=metadata)
-            documents.append(doc)
-            
-        return documents
+            for name, company, url, email, date in zip(names, companies, urls, emails, dates)
+        ]
+        
+        return IngestBatch(
+            texts=texts,
+            names=names,
+            companies=companies,
+            urls=urls,
+            emails=emails,
+            dates=dates
+        )
 
-    def create_knowledge_graph(self, documents: List[Document]):
-        """Create knowledge graph from documents"""
-        for doc in documents:
-            metadata = doc.metadata
-            
-            # Create Person node
-            self.graph_store.query(f"""
-                MERGE (p:Person {{name: '{metadata["name"]}'}})
-                SET p.email = '{metadata["email"]}',
-                    p.linkedin_url = '{metadata["linkedin_url"]}',
-                    p.connected_on = '{metadata["connected_on"]}'
-            """)
-            
-            # Create Company node and relationship
-            if metadata["company"]:
-                self.graph_store.query(f"""
-                    MERGE (c:Company {{name: '{metadata["company"]}'}})
-                    MERGE (p:Person {{name: '{metadata["name"]}'}})
-                    MERGE (p)-[:WORKS_AT]->(c)
-                """)
+    def create_knowledge_graph(self, batch: IngestBatch, batch_size: int = 5000):
+        """Create knowledge graph from loaded connections"""
+        # Index the MERGE keys so lookups don't scan every node
+        self.graph_store.query(
+            "CREATE INDEX person_name IF NOT EXISTS FOR (p:Person) ON (p.name)"
+        )
+        self.graph_store.query(
+            "CREATE INDEX company_name IF NOT EXISTS FOR (c:Company) ON (c.name)"
+        )
+        
+        # Create Person and Company nodes in batches, one round-trip per batch;
+        # columns are sent as parallel lists and indexed row by row
+        for start in range(0, len(batch), batch_size):
+            end = start + batch_size
+            self.graph_store.query(
+                """
+                UNWIND range(0, size($names) - 1) AS i
+                MERGE (p:Person {name: $names[i]})
+                SET p.email = $emails[i],
+                    p.linkedin_url = $urls[i],
+                    p.connected_on = $dates[i]
+                WITH p, $companies[i] AS company
+                WHERE company IS NOT NULL AND company <> ''
+                MERGE (c:Company {name: company})
+                MERGE (p)-[:WORKS_AT]->(c)
+                """,
+                param_map={
+                    "names": batch.names[start:end].tolist(),
+                    "emails": batch.emails[start:end].tolist(),
+                    "urls": batch.urls[start:end].tolist(),
+                    "dates": batch.dates[start:end].tolist(),
+                    "companies": batch.companies[start:end].tolist(),
+                },
+            )
 
-    def build_indexes(self, documents: List[Document]):
-        """Build vector index from documents"""
-        # Create nodes from documents
-        nodes = self.node_parser.get_nodes_from_documents(documents)
-        
-        # Build vector index
-        vector_index = VectorStoreIndex(
-            nodes,
-            storage_context=self.storage_context
+    def build_indexes(self, batch: IngestBatch, collection_name: str, batch_size: int = 5000):
+        """Build vector index from loaded connections in the named collection"""
+        # Start from an empty collection so a half-finished build is not kept
+        try:
+            self.chroma_client.delete_collection(collection_name)
+        except (ValueError, ChromaError):
+            pass
+        self._use_collection(self.chroma_client.create_collection(
+            collection_name,
+            metadata=COLLECTION_METADATA
+        ))
+        
+        # Each profile is a few short lines, so it is embedded as one chunk;
+        # embed them all up front in large batches
+        embeddings = np.asarray(
+            Settings.embed_model.get_text_embedding_batch(batch.texts, show_progress=True),
+            dtype=np.float32
         )
         
-        return vector_index 
\ No newline at end of file
+        # L2-normalize once here so the collection can rank by inner product
+        if len(embeddings):
+            embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-12
+        ids = [str(uuid.uuid4()) for _ in range(len(batch))]
+        
+        # Write to Chroma in bulk rather than through per-node dispatch. The
+        # flat metadata is read back into TextNodes by ChromaVectorStore.
+        for start in range(0, len(batch), batch_size):
+            end = start + batch_size
+            self.chroma_collection.add(
+                ids=ids[start:end],
+                embeddings=embeddings[start:end].tolist(),
+                documents=batch.texts[start:end],
+                metadatas=[
+                    {
+                        "name": name,
+                        "company": company,
+                        "linkedin_url": url,
+                        "email": email,
+                        "connected_on": date,
+                    }
+                    for name, company, url, email, date in zip(
+                        batch.names[start:end].tolist(),
+                        batch.companies[start:end].tolist(),
+                        batch.urls[start:end].tolist(),
+                        batch.emails[start:end].tolist(),
+                        batch.dates[start:end].tolist()
+                    )
+                ]
+            )
+        
+        # Build vector index on top of the populated store
+        vector_index = VectorStoreIndex.from_vector_store(self.vector_store)
+        
+        return vector_index
@@ -7,7 +7,10 @@ from llama_index.embeddings.openai import OpenAIEmbedding
 def setup_llamaindex():
     """Configure LlamaIndex settings"""
     Settings.llm = OpenAI(model="gpt-4")
-    Settings.embed_model = OpenAIEmbedding(model="text-embedding-3-small")
+    Settings.embed_model = OpenAIEmbedding(
+        model="text-embedding-3-small",
+        embed_batch_size=2048
+    )
 
 def analyze_network():
     """Analyze the LinkedIn network for insights"""
@@ -19,9 +22,7 @@ def analyze_network():
     )
     
     # Load and process data
-    documents = ingester.load_linkedin_data("linkedin_connections.csv")
-    ingester.create_knowledge_graph(documents)
-    vector_index = ingester.build_indexes(documents)
+    vector_index = ingester.ingest("linkedin_connections.csv")
     
     # Initialize analyzer
     analyzer = LinkedInAnalyzer(vector_index, ingester.graph_store)
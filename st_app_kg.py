@@ -1,34 +1,56 @@
 import streamlit as st
-from ingest import LinkedInDataIngester
+from ingest import LinkedInDataIngester, MAX_STORED_COLLECTIONS, csv_digest
 from analyzer import LinkedInAnalyzer
 from llama_index.core import Settings
 from llama_index.llms.openai import OpenAI
 from llama_index.embeddings.openai import OpenAIEmbedding
+from chromadb.errors import ChromaError
 import pandas as pd
 from datetime import datetime
 
+@st.cache_resource
 def setup_llamaindex():
     """Configure LlamaIndex settings"""
     Settings.llm = OpenAI(model="gpt-4", api_key=st.secrets["OPENAI_API_KEY"])
     Settings.embed_model = OpenAIEmbedding(
         model="text-embedding-3-small",
+        embed_batch_size=2048,
         api_key=st.secrets["OPENAI_API_KEY"]
     )
 
-def initialize_analyzer(csv_file):
-    """Initialize the LinkedIn data analyzer"""
+def has_collection(analyzer: LinkedInAnalyzer) -> bool:
+    """Check that the analyzer's Chroma collection has not been dropped"""
+    try:
+        analyzer.vector_index.vector_store.client.count()
+        return True
+    except (ValueError, ChromaError):
+        return False
+
+# Hold fewer analyzers than the ingester keeps collections, and rebuild any
+# whose collection was dropped as least recently used in the meantime
+@st.cache_resource(max_entries=MAX_STORED_COLLECTIONS // 2, validate=has_collection)
+def initialize_analyzer(file_digest: str, _file_bytes: bytes):
+    """Initialize the LinkedIn data analyzer once per uploaded file"""
     ingester = LinkedInDataIngester(
         neo4j_url=st.secrets["NEO4J_URL"],
         neo4j_username=st.secrets["NEO4J_USERNAME"],
         neo4j_password=st.secrets["NEO4J_PASSWORD"]
     )
     
-    documents = ingester.load_linkedin_data(csv_file)
-    ingester.create_knowledge_graph(documents)
-    vector_index = ingester.build_indexes(documents)
+    vector_index = ingester.ingest(_file_bytes, csv_hash=file_digest)
     
     return LinkedInAnalyzer(vector_index, ingester.graph_store)
 
+@st.cache_data(ttl=600)
+def find_connections(_analyzer: LinkedInAnalyzer, file_digest: str, criteria: dict):
+    """Find interesting connections, cached per uploaded file and criteria"""
+    return _analyzer.find_interesting_connections(criteria)
+
+@st.cache_data(ttl=300)
+def get_details(_analyzer: LinkedInAnalyzer, file_digest: str, name: str):
+    """Get connection details, cached per uploaded file and name"""
+    return _analyzer.get_connection_details(name)
+
 def main():
     st.title("LinkedIn Network Analyzer")
     st.sidebar.header("Analysis Options")
@@ -40,7 +62,11 @@ def main():
         try:
             # Initialize the analyzer
             setup_llamaindex()
-            analyzer = initialize_analyzer(uploaded_file)
+            # Hash the upload once; the digest keys every cache below, and
+            # the bytes themselves are passed unhashed
+            file_bytes = uploaded_file.getvalue()
+            file_digest = csv_digest(file_bytes)
+            analyzer = initialize_analyzer(file_digest, file_bytes)
             
             # Analysis type selection
             analysis_type = st.sidebar.selectbox(
@@ -53,7 +79,7 @@ def main():
                 company_name = st.text_input("Enter Company Name")
                 
                 if company_name:
-                    connections = analyzer.find_interesting_connections({
+                    connections = find_connections(analyzer, file_digest, {
                         "company": company_name
                     })
                     
@@ -61,29 +87,34 @@ def main():
                         st.write(f"### Connections at {company_name}")
                         for name, score in connections[:10]:
                             st.write(f"- {name} (Relevance: {score:.2f})")
-                            
-                            # Show detailed profile on click
-                            if st.button(f"View Details: {name}"):
-                                details = analyzer.get_connection_details(name)
-                                st.write("#### Profile Details")
-                                if details["graph_info"]:
-                                    person_info = details["graph_info"][0]["person"]
-                                    company_info = details["graph_info"][0]["company"]
-                                    
-                                    col1, col2 = st.columns(2)
-                                    with col1:
-                                        st.write("**Contact Info**")
-                                        st.write(f"Email: {person_info.get('email', 'Not available')}")
-                                        st.write(f"LinkedIn: {person_info.get('linkedin_url', 'Not available')}")
-                                    
-                                    with col2:
-                                        st.write("**Professional Info**")
-                                        st.write(f"Company: {company_info['name']}")
-                                        st.write(f"Connected On: {person_info.get('connected_on', 'Not available')}")
-                                    
-                                    st.write("**Similar Profiles**")
-                                    for profile in details["similar_profiles"]:
-                                        st.write(f"- {profile['name']} at {profile['company']}")
+                        
+                        # Show detailed profile for the selected connection
+                        selected = st.selectbox(
+                            "View details for",
+                            [name for name, _ in connections[:10]],
+                            index=None
+                        )
+                        if selected:
+                            details = get_details(analyzer, file_digest, selected)
+                            st.write("#### Profile Details")
+                            if details["graph_info"]:
+                                person_info = details["graph_info"][0]["person"]
+                                company_info = details["graph_info"][0]["company"]
+                                
+                                col1, col2 = st.columns(2)
+                                with col1:
+                                    st.write("**Contact Info**")
+                                    st.write(f"Email: {person_info.get('email', 'Not available')}")
+                                    st.write(f"LinkedIn: {person_info.get('linkedin_url', 'Not available')}")
+                                
+                                with col2:
+                                    st.write("**Professional Info**")
+                                    st.write(f"Company: {(company_info or {}).get('name', 'Not available')}")
+                                    st.write(f"Connected On: {person_info.get('connected_on', 'Not available')}")
+                                
+                                st.write("**Similar Profiles**")
+                                for profile in details["similar_profiles"]:
+                                    st.write(f"- {profile['name']} at {profile['company']}")
                     else:
                         st.write("No connections found at this company.")
             
@@ -98,7 +129,7 @@ def main():
                     end_date = st.date_input("End Date")
                 
                 if start_date and end_date:
-                    connections = analyzer.find_interesting_connections({
+                    connections = find_connections(analyzer, file_digest, {
                         "connected_after": start_date.strftime("%Y-%m-%d"),
                         "connected_before": end_date.strftime("%Y-%m-%d")
                     })
@@ -115,7 +146,7 @@ def main():
                 search_name = st.text_input("Enter Connection Name")
                 
                 if search_name:
-                    details = analyzer.get_connection_details(search_name)
+                    details = get_details(analyzer, file_digest, search_name)
                     
                     if details["graph_info"]:
                         person_info = details["graph_info"][0]["person"]
@@ -131,7 +162,7 @@ def main():
                         
                         with col2:
                             st.write("**Professional Information**")
-                            st.write(f"- Company: {company_info['name']}")
+                            st.write(f"- Company: {(company_info or {}).get('name', 'Not available')}")
                             st.write(f"- Connected On: {person_info.get('connected_on', 'Not available')}")
                         
                         st.write("### Similar Profiles")